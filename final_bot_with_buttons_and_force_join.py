@@ -16,10 +16,18 @@ import sqlite3
 import logging
 import asyncio
 import subprocess
+import multiprocessing
+import runpy
 import zipfile
 import shutil
 import psutil
 import re
+import io
+import json
+import hashlib
+import hmac
+from collections import OrderedDict, deque
+from multiprocessing import forkserver, process as multiprocessing_process
 from datetime import datetime, timedelta
 from aiogram import Bot, Dispatcher, types, F
 from aiogram.filters import Command
@@ -32,7 +40,7 @@ from aiogram.types import (
     KeyboardButton
 )
 from aiogram.exceptions import TelegramBadRequest
-from aiohttp import web
+from aiohttp import web, ClientSession, ClientTimeout, FormData
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -55,6 +63,44 @@ LOGS_FOLDER = "bot_logs"
 
 admin_ids = [7089004530]  # YOUR TELEGRAM ID
 
+# Hosted bots are forked from a warm interpreter with these modules already imported
+USE_WARM_POOL = os.getenv("USE_WARM_POOL", "True").lower() == "true"
+WARM_POOL_PRELOAD = ["__main__", "aiogram", "aiohttp"]
+MONITOR_INTERVAL = 30  # seconds between hosted bot health checks
+# CPU rate since the last activity above which a bot counts as active; a rate, because
+# idle long polling costs a little CPU every cycle and that adds up over a long window
+HIBERNATE_CPU_SECONDS_PER_MINUTE = 0.5
+
+# Gateway mode: hosted bots get updates through our webhook server instead of polling
+# (needs USE_WEBHOOK and the warm pool; only aiogram bots, others keep polling)
+USE_GATEWAY = os.getenv("USE_GATEWAY", "False").lower() == "true"
+GATEWAY_URL = os.getenv("GATEWAY_URL", WEBHOOK_URL).rstrip("/")
+GATEWAY_SOCKETS_FOLDER = "gateway_sockets"
+GATEWAY_BUFFER_SIZE = 1000  # updates kept per bot while its process is down
+GATEWAY_CONNECT_TIMEOUT = 30  # seconds a started bot has to connect before it is left on polling
+
+# Node cluster: extra machines (node agents) hosted bots can be placed on
+NODE_AGENTS = [url.strip().rstrip("/") for url in os.getenv("NODE_AGENTS", "").split(",") if url.strip()]
+NODE_AGENT_SECRET = os.getenv("NODE_AGENT_SECRET", "")  # required by node agents
+LOCAL_NODE = "local"
+NODE_AGENT_TIMEOUT = 30  # seconds for agent API calls
+NODE_STATS_TIMEOUT = 5  # stats are polled often, so an unreachable agent must fail fast
+NODE_SPAWN_TIMEOUT = 900  # spawn installs requirements before answering
+
+# Set NODE_AGENT_PORT to run this script as a node agent instead of the bot
+NODE_AGENT_PORT = int(os.getenv("NODE_AGENT_PORT", 0))
+NODE_AGENT_HOST = os.getenv("NODE_AGENT_HOST", "127.0.0.1")
+NODE_AGENT_FOLDER = os.getenv("NODE_AGENT_FOLDER", "node_bots")
+
+# Full-text log search: one SQLite FTS5 shard per day under LOG_INDEX_FOLDER
+LOG_INDEX_FOLDER = "log_index"
+LOG_INDEX_INTERVAL = 10  # seconds between indexing passes
+LOG_INDEX_CHUNK_BYTES = 4 * 1024 * 1024  # max new log data read per bot per pass
+LOG_RETENTION_DAYS = int(os.getenv("LOG_RETENTION_DAYS", 7))
+LOG_SEARCH_LIMIT = 20
+LOG_SEARCH_PROMPT_SECONDS = 300  # how long "Search logs" waits for the search text
+LOG_TIMESTAMP_RE = re.compile(r'^\[?(\d{4}-\d{2}-\d{2})[ T](\d{2}:\d{2}:\d{2})')
+
 # Hosting Plans
 HOSTING_PLANS = {
     "free": {
@@ -64,7 +110,8 @@ HOSTING_PLANS = {
         "max_bots": 1,
         "max_ram_mb": 256,
         "max_cpu_percent": 50,
-        "auto_restart": False
+        "auto_restart": False,
+        "hibernate_after_minutes": int(os.getenv("HIBERNATE_AFTER_MINUTES", 30))  # 0 disables
     },
     "starter": {
         "title": "Starter Plan ⭐",
@@ -101,13 +148,16 @@ HOSTING_PLANS = {
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-bot = Bot(token=BOT_TOKEN)
+# A node agent never talks to Telegram, so it doesn't get the control bot's token
+bot = None if NODE_AGENT_PORT else Bot(token=BOT_TOKEN)
 dp = Dispatcher()
 
 # In-memory storage
 user_subscriptions = {}
 user_bots = {}
 banned_users = set()
+background_tasks = []
+pending_log_searches = {}  # user_id -> (bot index, asked at) waiting for search text
 
 # ============================================================
 # FORCE JOIN CHANNEL CHECK
@@ -123,26 +173,161 @@ async def check_channel_membership(user_id):
         logger.error(f"Error checking membership: {e}")
         return False
 
+# Static keyboards are built once and shared by every handler
+JOIN_CHANNEL_KEYBOARD = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="📢 Join Channel", url=f"https://t.me/{REQUIRED_CHANNEL.replace('@', '')}")],
+    [InlineKeyboardButton(text="✅ I Joined!", callback_data="check_join")]
+])
+
+MAIN_KEYBOARD = ReplyKeyboardMarkup(
+    keyboard=[
+        [KeyboardButton(text="🏠 Home"), KeyboardButton(text="🤖 My Bots")],
+        [KeyboardButton(text="🚀 Deploy Bot"), KeyboardButton(text="💎 Plans")],
+        [KeyboardButton(text="📊 Status"), KeyboardButton(text="ℹ️ Help")]
+    ],
+    resize_keyboard=True,
+    persistent=True
+)
+
+MENU_BUTTONS = ["🏠 Home", "🤖 My Bots", "🚀 Deploy Bot", "💎 Plans", "📊 Status", "ℹ️ Help"]
+
+PLANS_KEYBOARD = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="⭐ Buy Starter", callback_data="buy:starter")],
+    [InlineKeyboardButton(text="💎 Buy Pro", callback_data="buy:pro")],
+    [InlineKeyboardButton(text="👑 Buy Enterprise", callback_data="buy:enterprise")]
+])
+
 def get_join_channel_keyboard():
     """Get keyboard with join channel button"""
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="📢 Join Channel", url=f"https://t.me/{REQUIRED_CHANNEL.replace('@', '')}")],
-        [InlineKeyboardButton(text="✅ I Joined!", callback_data="check_join")]
-    ])
-    return keyboard
+    return JOIN_CHANNEL_KEYBOARD
 
 def get_main_keyboard():
     """Get main menu keyboard"""
-    keyboard = ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text="🏠 Home"), KeyboardButton(text="🤖 My Bots")],
-            [KeyboardButton(text="🚀 Deploy Bot"), KeyboardButton(text="💎 Plans")],
-            [KeyboardButton(text="📊 Status"), KeyboardButton(text="ℹ️ Help")]
-        ],
-        resize_keyboard=True,
-        persistent=True
-    )
-    return keyboard
+    return MAIN_KEYBOARD
+
+# ============================================================
+# VIEW CACHE
+# ============================================================
+
+# Rendered per-user views: {user_id: {view_key: (text, keyboard)}}
+user_views = {}
+
+# Last view shown in each message: {(chat_id, message_id): (text, keyboard)}
+rendered_messages = OrderedDict()
+MAX_RENDERED_MESSAGES = 1000
+
+NO_BOTS_TEXT = (
+    "🤖 You have no deployed bots yet.\\n\\n"
+    "Tap **🚀 Deploy Bot** to deploy your first bot!"
+)
+
+def invalidate_user_views(user_id):
+    """Drop cached views after the user's bot list or a bot status changes"""
+    user_views.pop(user_id, None)
+
+def get_status_emoji(status):
+    """Get emoji for a hosted bot status"""
+    if status == 'running':
+        return "🟢"
+    if status == 'hibernated':
+        return "💤"
+    return "🔴"
+
+def render_my_bots(user_id):
+    """Render (text, keyboard) for the user's bot list"""
+    views = user_views.setdefault(user_id, {})
+    if 'my_bots' in views:
+        return views['my_bots']
+    
+    if not user_bots.get(user_id):
+        view = (NO_BOTS_TEXT, None)
+        views['my_bots'] = view
+        return view
+    
+    text = "🤖 **Your Deployed Bots:**\\n\\n"
+    
+    keyboard_buttons = []
+    for i, bot_info in enumerate(user_bots[user_id]):
+        status_emoji = get_status_emoji(bot_info['status'])
+        text += f"{status_emoji} **{bot_info['name']}**\\n"
+        text += f"Status: {bot_info['status']}\\n\\n"
+        
+        keyboard_buttons.append([
+            InlineKeyboardButton(
+                text=f"{status_emoji} {bot_info['name'][:20]}",
+                callback_data=f"bot:{i}"
+            )
+        ])
+    
+    keyboard_buttons.append([
+        InlineKeyboardButton(text="🚀 Deploy New Bot", callback_data="deploy_new")
+    ])
+    
+    view = (text, InlineKeyboardMarkup(inline_keyboard=keyboard_buttons))
+    views['my_bots'] = view
+    return view
+
+def render_bot_actions(user_id, bot_index):
+    """Render (text, keyboard) for a single bot's action menu"""
+    views = user_views.setdefault(user_id, {})
+    key = f"bot:{bot_index}"
+    if key in views:
+        return views[key]
+    
+    bot_info = user_bots[user_id][bot_index]
+    
+    if bot_info['status'] == 'running':
+        status_text = '🟢 Running'
+    elif bot_info['status'] == 'hibernated':
+        status_text = '💤 Hibernating (wakes on new messages)'
+    else:
+        status_text = '🔴 Stopped'
+    
+    text = f"""
+🤖 **{bot_info['name']}**
+
+Status: {status_text}
+"""
+    
+    buttons = []
+    if bot_info['status'] == 'running':
+        buttons.append([InlineKeyboardButton(text="⏹️ Stop", callback_data=f"stop:{bot_index}")])
+        buttons.append([InlineKeyboardButton(text="🔄 Restart", callback_data=f"restart:{bot_index}")])
+    elif bot_info['status'] == 'hibernated':
+        buttons.append([InlineKeyboardButton(text="☀️ Wake", callback_data=f"start:{bot_index}")])
+    else:
+        buttons.append([InlineKeyboardButton(text="▶️ Start", callback_data=f"start:{bot_index}")])
+    
+    buttons.append([InlineKeyboardButton(text="📋 Logs", callback_data=f"logs:{bot_index}")])
+    buttons.append([InlineKeyboardButton(text="🔎 Search logs", callback_data=f"logsearch:{bot_index}")])
+    buttons.append([InlineKeyboardButton(text="🗑️ Delete", callback_data=f"delbot:{bot_index}")])
+    buttons.append([InlineKeyboardButton(text="🔙 Back", callback_data="my_bots_inline")])
+    
+    view = (text, InlineKeyboardMarkup(inline_keyboard=buttons))
+    views[key] = view
+    return view
+
+def remember_view(message, view):
+    """Record which view a message is currently showing"""
+    key = (message.chat.id, message.message_id)
+    rendered_messages[key] = view
+    rendered_messages.move_to_end(key)
+    while len(rendered_messages) > MAX_RENDERED_MESSAGES:
+        rendered_messages.popitem(last=False)
+
+async def edit_view(message, view):
+    """Edit message to show view, skipping the API call when nothing changed"""
+    if rendered_messages.get((message.chat.id, message.message_id)) == view:
+        return False
+    
+    text, keyboard = view
+    try:
+        await message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
+    except TelegramBadRequest as e:
+        if "message is not modified" not in str(e):
+            raise
+    remember_view(message, view)
+    return True
 
 # ============================================================
 # MIDDLEWARE FOR FORCE JOIN
@@ -183,9 +368,28 @@ async def force_join_middleware(handler, event, data):
     # User is member - continue
     return await handler(event, data)
 
+async def pending_search_middleware(handler, event, data):
+    """Forget a pending log search once the user does anything but answer it"""
+    user = getattr(event, 'from_user', None)
+    if user and user.id in pending_log_searches:
+        _, asked_at = pending_log_searches[user.id]
+        is_answer = (
+            isinstance(event, types.Message)
+            and event.text
+            and not event.text.startswith("/")
+            and event.text not in MENU_BUTTONS
+            and (datetime.now() - asked_at).total_seconds() < LOG_SEARCH_PROMPT_SECONDS
+        )
+        if not is_answer:
+            del pending_log_searches[user.id]
+    
+    return await handler(event, data)
+
 # Register middleware
 dp.message.middleware(force_join_middleware)
 dp.callback_query.middleware(force_join_middleware)
+dp.message.middleware(pending_search_middleware)
+dp.callback_query.middleware(pending_search_middleware)
 
 # ============================================================
 # DATABASE FUNCTIONS
@@ -228,10 +432,20 @@ def init_database():
             status TEXT DEFAULT 'stopped',
             created_date TEXT,
             last_started TEXT,
+            pid INTEGER,
+            pid_started REAL,
             FOREIGN KEY (user_id) REFERENCES users(user_id)
         )
     """)
     
+    # Columns added after hosted_bots was first created
+    c.execute("PRAGMA table_info(hosted_bots)")
+    columns = {row[1] for row in c.fetchall()}
+    if 'pid' not in columns:
+        c.execute("ALTER TABLE hosted_bots ADD COLUMN pid INTEGER")
+    if 'pid_started' not in columns:
+        c.execute("ALTER TABLE hosted_bots ADD COLUMN pid_started REAL")
+    
     c.execute("""
         CREATE TABLE IF NOT EXISTS payment_transactions (
             transaction_id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -244,6 +458,18 @@ def init_database():
         )
     """)
     
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS log_index_offsets (
+            source TEXT PRIMARY KEY,
+            offset INTEGER DEFAULT 0,
+            indexed_at REAL
+        )
+    """)
+    
+    c.execute("PRAGMA table_info(log_index_offsets)")
+    if 'indexed_at' not in {row[1] for row in c.fetchall()}:
+        c.execute("ALTER TABLE log_index_offsets ADD COLUMN indexed_at REAL")
+    
     c.execute("""
         CREATE TABLE IF NOT EXISTS bot_stats (
             stat_name TEXT PRIMARY KEY,
@@ -254,6 +480,8 @@ def init_database():
     c.execute("INSERT OR IGNORE INTO bot_stats VALUES ('total_users', 0)")
     c.execute("INSERT OR IGNORE INTO bot_stats VALUES ('total_hosted_bots', 0)")
     c.execute("INSERT OR IGNORE INTO bot_stats VALUES ('total_payments', 0)")
+    c.execute("INSERT OR IGNORE INTO bot_stats VALUES ('total_hibernations', 0)")
+    c.execute("INSERT OR IGNORE INTO bot_stats VALUES ('ram_reclaimed_mb', 0)")
     
     conn.commit()
     conn.close()
@@ -278,6 +506,1021 @@ def get_user_bot_count(user_id):
     """Get number of bots user has"""
     return len(user_bots.get(user_id, []))
 
+# ============================================================
+# HOSTED BOT PROCESSES
+# ============================================================
+
+warm_pool = None
+
+def init_warm_pool():
+    """Start the forkserver that hosted bots are forked from"""
+    global warm_pool
+    
+    if not USE_WARM_POOL or 'forkserver' not in multiprocessing.get_all_start_methods():
+        logger.info("🧊 Warm pool disabled, hosted bots start cold")
+        return
+    
+    warm_pool = multiprocessing.get_context('forkserver')
+    warm_pool.set_forkserver_preload(WARM_POOL_PRELOAD)
+    forkserver.ensure_running()
+    logger.info("🔥 Warm pool ready")
+
+def run_hosted_bot_process(folder, env, log_path):
+    """Entry point of a hosted bot forked from the warm pool"""
+    os.chdir(folder)
+    os.environ.clear()
+    os.environ.update(env)
+    
+    # The pool preloaded this script, so drop our secrets before running user code
+    globals().update(BOT_TOKEN=None, NODE_AGENT_SECRET=None, WEBHOOK_URL=None, bot=None)
+    
+    # Send all output to the bot's log file
+    log_fd = os.open(log_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    os.dup2(log_fd, 1)
+    os.dup2(log_fd, 2)
+    os.close(log_fd)
+    sys.stdout = open(1, 'w', buffering=1, closefd=False)
+    sys.stderr = open(2, 'w', buffering=1, closefd=False)
+    
+    # Give the bot a clean logging setup instead of ours
+    for handler in logging.root.handlers[:]:
+        logging.root.removeHandler(handler)
+    logging.root.setLevel(logging.WARNING)
+    
+    # Log each handled update, which is how the monitor sees a polling bot is in use
+    event_logger = logging.getLogger('aiogram.event')
+    event_logger.addHandler(logging.StreamHandler())
+    event_logger.setLevel(logging.INFO)
+    event_logger.propagate = False
+    
+    if env.get('GATEWAY_SOCKET'):
+        install_gateway_polling(env['GATEWAY_SOCKET'])
+    
+    main_py = os.path.join(folder, 'main.py')
+    sys.path.insert(0, folder)
+    sys.argv = [main_py]
+    runpy.run_path(main_py, run_name='__main__')
+
+def install_gateway_polling(socket_path):
+    """Make aiogram polling in this process read updates from the gateway socket
+
+    The control bot only moves the webhook to the gateway once this connects, so a bot
+    that doesn't poll through aiogram's Dispatcher keeps polling Telegram itself.
+    """
+    polling_options = {'polling_timeout', 'handle_as_tasks', 'backoff_config', 'allowed_updates',
+                       'handle_signals', 'close_bot_session', 'tasks_concurrency_limit'}
+    start_polling = Dispatcher.start_polling
+    delete_webhook = Bot.delete_webhook
+    
+    async def connect(allowed_updates, attempts):
+        """Ask the gateway to serve this bot; returns (reader, writer), or None if it won't"""
+        for _ in range(attempts):
+            try:
+                reader, writer = await asyncio.open_unix_connection(socket_path)
+                break
+            except OSError:
+                await asyncio.sleep(1)
+        else:
+            return None
+        
+        try:
+            writer.write(json.dumps({'allowed_updates': allowed_updates}).encode() + b"\n")
+            await writer.drain()
+            reply = await asyncio.wait_for(reader.readline(), timeout=60)
+            if reply and json.loads(reply).get('gateway'):
+                return reader, writer
+        except (OSError, ValueError, asyncio.TimeoutError):
+            pass
+        writer.close()
+        return None
+    
+    async def gateway_start_polling(self, *bots, **kwargs):
+        allowed_updates = kwargs.get('allowed_updates')
+        if not isinstance(allowed_updates, (list, tuple)):
+            allowed_updates = self.resolve_used_update_types()  # what polling would ask for
+        
+        connection = await connect(list(allowed_updates), 10)
+        if connection is None:
+            # Not served through the gateway, so poll Telegram as usual
+            Bot.delete_webhook = delete_webhook
+            return await start_polling(self, *bots, **kwargs)
+        
+        reader, writer = connection
+        bot = bots[-1]
+        workflow_data = {
+            "dispatcher": self, "bots": bots, **self.workflow_data,
+            **{key: value for key, value in kwargs.items() if key not in polling_options}
+        }
+        await self.emit_startup(bot=bot, **workflow_data)
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    # The control bot restarted; it reopens the same socket path
+                    writer.close()
+                    connection = await connect(list(allowed_updates), 300)
+                    if connection is None:
+                        raise RuntimeError(f"Gateway connection lost: {socket_path}")
+                    reader, writer = connection
+                    continue
+                feed = self.feed_raw_update(bot, json.loads(line), **workflow_data)
+                if kwargs.get('handle_as_tasks', True):
+                    task = asyncio.create_task(feed)
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                else:
+                    await feed
+        finally:
+            writer.close()
+            await self.emit_shutdown(bot=bot, **workflow_data)
+            if kwargs.get('close_bot_session', True):
+                await bot.session.close()
+    
+    async def keep_gateway_webhook(self, *args, **kwargs):
+        # Bots often drop their webhook on startup; the gateway's must stay
+        return True
+    
+    Dispatcher.start_polling = gateway_start_polling
+    Bot.delete_webhook = keep_gateway_webhook
+
+def spawn_bot_process(folder, token, log_path, gateway_socket=None):
+    """Start main.py in folder, forking from the warm pool when available"""
+    # Hosted bots are untrusted, so they only get what they need to run
+    env = {key: os.environ[key] for key in ('PATH', 'HOME', 'LANG') if key in os.environ}
+    env['BOT_TOKEN'] = token
+    if gateway_socket:
+        env['GATEWAY_SOCKET'] = gateway_socket
+    
+    if warm_pool is not None:
+        process = warm_pool.Process(
+            target=run_hosted_bot_process,
+            args=(folder, env, log_path)
+        )
+        process.start()
+        # Like a cold bot it may have children of its own and outlives our shutdown,
+        # so multiprocessing must neither kill nor join it at exit
+        multiprocessing_process._children.discard(process)
+        return process
+    
+    with open(log_path, 'a') as log_file:
+        return subprocess.Popen(
+            [sys.executable, 'main.py'],
+            cwd=folder,
+            env=env,
+            stdout=log_file,
+            stderr=subprocess.STDOUT
+        )
+
+def get_bot_key(user_id, bot_info):
+    """Get the id a hosted bot is known by on every node"""
+    return f"{user_id}_{bot_info['name']}"
+
+def get_log_path(user_id, bot_info):
+    """Get path of a hosted bot's log file"""
+    return os.path.abspath(os.path.join(LOGS_FOLDER, f"{get_bot_key(user_id, bot_info)}.log"))
+
+def tail_file(path, lines):
+    """Get the last lines of a text file"""
+    if not os.path.exists(path):
+        return ""
+    with open(path, 'rb') as f:
+        f.seek(max(0, os.path.getsize(path) - 64 * 1024))
+        data = f.read().decode(errors='replace')
+    return "\n".join(data.splitlines()[-lines:])
+
+def is_process_running(process):
+    """Check if a hosted bot process (warm, cold or adopted) is alive"""
+    if process is None:
+        return False
+    if isinstance(process, subprocess.Popen):
+        return process.poll() is None
+    if isinstance(process, psutil.Process):
+        try:
+            return process.is_running() and process.status() != psutil.STATUS_ZOMBIE
+        except psutil.Error:
+            return False
+    return process.is_alive()
+
+def wait_process(process):
+    """Block until a hosted bot process exits"""
+    if isinstance(process, subprocess.Popen):
+        process.wait()
+    elif isinstance(process, psutil.Process):
+        try:
+            process.wait()
+        except psutil.Error:
+            pass
+    else:
+        process.join()
+
+def find_bot_process(pid, started):
+    """Get a process left running by an earlier run of this bot, if it is still ours"""
+    if not pid:
+        return None
+    try:
+        process = psutil.Process(pid)
+        if abs(process.create_time() - started) > 1:
+            return None  # pid was reused
+    except psutil.Error:
+        return None
+    return process if is_process_running(process) else None
+
+async def terminate_process(process):
+    """Stop a hosted bot process, killing it if it ignores SIGTERM"""
+    if not is_process_running(process):
+        return
+    
+    try:
+        process.terminate()
+    except (psutil.NoSuchProcess, ProcessLookupError):
+        return  # exited since the check
+    try:
+        await asyncio.wait_for(asyncio.to_thread(wait_process, process), timeout=10)
+    except asyncio.TimeoutError:
+        process.kill()
+        await asyncio.to_thread(wait_process, process)
+
+def get_process_usage(process, log_path):
+    """Get liveness, memory, CPU time and log size of a hosted bot process"""
+    usage = {
+        'alive': is_process_running(process),
+        'pid': process.pid if process is not None else None,
+        'rss': 0,
+        'uss': 0,
+        'cpu_seconds': 0.0,
+        'log_size': os.path.getsize(log_path) if os.path.exists(log_path) else 0
+    }
+    if usage['alive']:
+        try:
+            proc = psutil.Process(process.pid)
+            cpu_times = proc.cpu_times()
+            usage['rss'] = proc.memory_info().rss
+            usage['cpu_seconds'] = cpu_times.user + cpu_times.system
+        except psutil.Error:
+            pass
+        # Pages shared with the warm pool are not this bot's, so limits use USS
+        try:
+            usage['uss'] = psutil.Process(process.pid).memory_full_info().uss
+        except psutil.Error:
+            usage['uss'] = usage['rss']
+    return usage
+
+def set_bot_status(user_id, bot_info, status):
+    """Update bot status in memory and database"""
+    bot_info['status'] = status
+    invalidate_user_views(user_id)
+    
+    # Remember the local process so a restarted control bot can adopt it
+    pid, pid_started = None, None
+    process = bot_info.get('process')
+    if status == 'running' and process is not None:
+        try:
+            pid, pid_started = process.pid, psutil.Process(process.pid).create_time()
+        except psutil.Error:
+            pass
+    
+    conn = sqlite3.connect(DATABASE_PATH)
+    c = conn.cursor()
+    if status == 'running':
+        c.execute("""
+            UPDATE hosted_bots SET status = ?, last_started = ?, pid = ?, pid_started = ?
+            WHERE user_id = ? AND bot_name = ?
+        """, (status, datetime.now().isoformat(), pid, pid_started, user_id, bot_info['name']))
+    else:
+        c.execute("""
+            UPDATE hosted_bots SET status = ?, pid = NULL, pid_started = NULL
+            WHERE user_id = ? AND bot_name = ?
+        """, (status, user_id, bot_info['name']))
+    conn.commit()
+    conn.close()
+
+def get_bot_lock(bot_info):
+    """Get the lock that keeps starts and stops of one bot from overlapping"""
+    if 'lock' not in bot_info:
+        bot_info['lock'] = asyncio.Lock()
+    return bot_info['lock']
+
+async def start_hosted_bot(user_id, bot_info):
+    """Start a hosted bot on the node with the most room for it"""
+    async with get_bot_lock(bot_info):
+        # A concurrent start (double tap, webhook and monitor wake) already did it
+        if bot_info['status'] == 'running' and is_bot_running(user_id, bot_info):
+            return
+        
+        limits = get_plan_limits(user_id)
+        node_name = await place_bot(limits['max_ram_mb']) if NODE_AGENTS else LOCAL_NODE
+        
+        if node_name == LOCAL_NODE:
+            gateway_socket = None
+            if gateway_enabled():
+                channel = await open_gateway_channel(user_id, bot_info)
+                gateway_socket = channel['socket_path']
+            
+            process = spawn_bot_process(
+                os.path.abspath(bot_info['folder']),
+                bot_info['token'],
+                get_log_path(user_id, bot_info),
+                gateway_socket
+            )
+            pid = process.pid
+        else:
+            await close_gateway_channel(bot_info)
+            process = None
+            pid = await spawn_on_node(node_name, user_id, bot_info)
+        
+        bot_info['node'] = node_name
+        bot_info['process'] = process
+        bot_info['last_activity'] = datetime.now()
+        bot_info['activity_sample'] = None
+        bot_info.pop('hibernated_rss', None)
+        set_bot_status(user_id, bot_info, 'running')
+        logger.info(f"▶️ Started {bot_info['name']} for {user_id} on {node_name} (pid {pid})")
+
+async def stop_hosted_bot(user_id, bot_info, status='stopped'):
+    """Stop a hosted bot wherever it runs"""
+    async with get_bot_lock(bot_info):
+        node_name = bot_info.get('node', LOCAL_NODE)
+        
+        if node_name == LOCAL_NODE:
+            await terminate_process(bot_info.get('process'))
+        else:
+            await stop_on_node(node_name, user_id, bot_info)
+        
+        bot_info['process'] = None
+        set_bot_status(user_id, bot_info, status)
+        
+        # A hibernated bot keeps its channel so updates wake it; a stopped one gets its token back
+        if status == 'stopped':
+            await close_gateway_channel(bot_info)
+
+def is_bot_running(user_id, bot_info):
+    """Check if a hosted bot's process is alive on its node"""
+    if bot_info.get('node', LOCAL_NODE) == LOCAL_NODE:
+        return is_process_running(bot_info.get('process'))
+    usage = get_bot_usage(user_id, bot_info)
+    return bool(usage and usage['alive'])
+
+def get_bot_usage(user_id, bot_info):
+    """Get a running bot's usage, from its node's last stats if it runs remotely"""
+    node_name = bot_info.get('node', LOCAL_NODE)
+    if node_name == LOCAL_NODE:
+        return get_process_usage(bot_info.get('process'), get_log_path(user_id, bot_info))
+    return nodes[node_name]['stats'].get('bots', {}).get(get_bot_key(user_id, bot_info))
+
+async def restore_hosted_bots():
+    """Reload deployed bots from the database and restart the ones that were running"""
+    conn = sqlite3.connect(DATABASE_PATH)
+    c = conn.cursor()
+    c.execute("""
+        SELECT user_id, bot_name, bot_token, bot_file, status, pid, pid_started
+        FROM hosted_bots ORDER BY bot_id
+    """)
+    rows = c.fetchall()
+    conn.close()
+    
+    if NODE_AGENTS:
+        await refresh_node_stats()
+    
+    to_start = []
+    adopted = 0
+    for user_id, bot_name, bot_token, bot_file, status, pid, pid_started in rows:
+        folder = os.path.join(BOTS_FOLDER, str(user_id), bot_name)
+        if not os.path.exists(folder):
+            continue
+        
+        # Bots outlive a killed or crashed control bot; never run a token twice
+        old_process = find_bot_process(pid, pid_started)
+        if old_process is not None and status != 'running':
+            await terminate_process(old_process)
+            old_process = None
+        
+        bot_info = {
+            'name': bot_name,
+            'file': bot_file,
+            'folder': folder,
+            'token': bot_token,
+            'status': 'hibernated' if status == 'hibernated' else 'stopped',
+            'process': None
+        }
+        user_bots.setdefault(user_id, []).append(bot_info)
+        if status != 'running':
+            continue
+        
+        if old_process is not None:
+            if gateway_enabled():
+                try:
+                    await open_gateway_channel(user_id, bot_info)
+                except Exception as e:
+                    # Its gateway socket can't be reopened, so start it afresh instead
+                    logger.error(f"Restore error for {bot_info['name']}: {e}")
+                    await terminate_process(old_process)
+                    to_start.append((user_id, bot_info))
+                    continue
+            bot_info['node'] = LOCAL_NODE
+            bot_info['process'] = old_process
+            bot_info['status'] = 'running'
+            bot_info['last_activity'] = datetime.now()
+            bot_info['activity_sample'] = None
+            adopted += 1
+            continue
+        
+        # Bots on node agents keep running while we restart, so adopt them
+        node_name = find_bot_node(get_bot_key(user_id, bot_info))
+        if node_name is not None:
+            bot_info['node'] = node_name
+            bot_info['status'] = 'running'
+            bot_info['last_activity'] = datetime.now()
+            bot_info['activity_sample'] = None
+            adopted += 1
+        else:
+            to_start.append((user_id, bot_info))
+    
+    for user_id, bot_info in to_start:
+        try:
+            await start_hosted_bot(user_id, bot_info)
+        except Exception as e:
+            logger.error(f"Restore error for {bot_info['name']}: {e}")
+            set_bot_status(user_id, bot_info, 'stopped')
+    
+    logger.info(f"✅ Restored {len(rows)} hosted bots, restarted {len(to_start)}, adopted {adopted}")
+
+def sample_bot_activity(user_id, bot_info):
+    """Refresh last_activity if the bot wrote logs, or used CPU at an active rate, since it was last active"""
+    usage = get_bot_usage(user_id, bot_info)
+    if not usage or not usage['alive']:
+        return
+    
+    now = datetime.now()
+    cpu, log_size = usage['cpu_seconds'], usage['log_size']
+    baseline = bot_info.get('activity_sample')
+    if baseline is None:
+        bot_info['activity_sample'] = (cpu, log_size, now)
+        return
+    
+    minutes = max((now - baseline[2]).total_seconds(), MONITOR_INTERVAL) / 60
+    if (cpu - baseline[0]) / minutes >= HIBERNATE_CPU_SECONDS_PER_MINUTE or log_size != baseline[1]:
+        bot_info['activity_sample'] = (cpu, log_size, now)
+        bot_info['last_activity'] = now
+
+def get_reclaimed_ram_mb():
+    """Get RAM currently freed by hibernated bots"""
+    total = sum(
+        bot_info.get('hibernated_rss', 0)
+        for bots in user_bots.values()
+        for bot_info in bots
+        if bot_info['status'] == 'hibernated'
+    )
+    return total // (1024 * 1024)
+
+async def hibernate_hosted_bot(user_id, bot_info):
+    """Stop an idle bot to free its RAM until it gets new updates"""
+    usage = get_bot_usage(user_id, bot_info)
+    # Only the bot's own pages are freed; the rest is shared with the warm pool
+    rss = (usage.get('uss') or usage['rss']) if usage else 0
+    
+    await stop_hosted_bot(user_id, bot_info, status='hibernated')
+    bot_info['hibernated_rss'] = rss
+    
+    conn = sqlite3.connect(DATABASE_PATH)
+    c = conn.cursor()
+    c.execute("UPDATE bot_stats SET stat_value = stat_value + 1 WHERE stat_name = 'total_hibernations'")
+    c.execute("UPDATE bot_stats SET stat_value = stat_value + ? WHERE stat_name = 'ram_reclaimed_mb'",
+              (rss // (1024 * 1024),))
+    conn.commit()
+    conn.close()
+    
+    logger.info(
+        f"💤 Hibernated {bot_info['name']} for {user_id} "
+        f"(freed {rss // (1024 * 1024)} MB, {get_reclaimed_ram_mb()} MB reclaimed in total)"
+    )
+
+async def stop_over_ram_limit(user_id, bot_info, max_ram_mb):
+    """Stop a bot using more RAM than its plan allows and tell its owner"""
+    logger.warning(f"💾 {bot_info['name']} for {user_id} is over {max_ram_mb} MB, stopping")
+    await stop_hosted_bot(user_id, bot_info)
+    try:
+        await bot.send_message(
+            user_id,
+            f"⚠️ {bot_info['name']} was stopped: it used more than the {max_ram_mb} MB RAM "
+            f"your plan allows."
+        )
+    except Exception as e:
+        logger.error(f"RAM limit notice failed: {e}")
+
+async def has_pending_updates(session, token):
+    """Check if Telegram is holding updates for a bot"""
+    try:
+        async with session.get(f"https://api.telegram.org/bot{token}/getWebhookInfo") as resp:
+            data = await resp.json()
+        return data.get('result', {}).get('pending_update_count', 0) > 0
+    except Exception as e:
+        logger.error(f"Pending updates check failed: {e}")
+        return False
+
+async def wake_hibernated_bots(session):
+    """Start every hibernated bot that Telegram is holding updates for"""
+    hibernated = [
+        (user_id, bot_info)
+        for user_id, bots in list(user_bots.items())
+        for bot_info in bots
+        if bot_info['status'] == 'hibernated'
+    ]
+    pending = await asyncio.gather(*(
+        has_pending_updates(session, bot_info['token']) for _, bot_info in hibernated
+    ))
+    
+    for (user_id, bot_info), has_pending in zip(hibernated, pending):
+        if not has_pending or bot_info['status'] != 'hibernated':
+            continue
+        logger.info(f"☀️ Waking {bot_info['name']} for {user_id}")
+        try:
+            await start_hosted_bot(user_id, bot_info)
+        except Exception as e:
+            logger.error(f"Wake error: {e}")
+
+async def supervise_hosted_bot(session, user_id, bot_info, limits):
+    """Restart, stop or hibernate a running bot as its state and plan require"""
+    if not is_bot_running(user_id, bot_info):
+        if limits['auto_restart']:
+            logger.warning(f"🔄 Auto-restarting {bot_info['name']} for {user_id}")
+            try:
+                await start_hosted_bot(user_id, bot_info)
+            except Exception as e:
+                logger.error(f"Auto-restart error: {e}")
+                set_bot_status(user_id, bot_info, 'stopped')
+        else:
+            bot_info['process'] = None
+            set_bot_status(user_id, bot_info, 'stopped')
+            await close_gateway_channel(bot_info)
+        return
+    
+    usage = get_bot_usage(user_id, bot_info)
+    if usage and (usage.get('uss') or usage['rss']) > limits['max_ram_mb'] * 1024 * 1024:
+        await stop_over_ram_limit(user_id, bot_info, limits['max_ram_mb'])
+        return
+    
+    hibernate_after = limits.get('hibernate_after_minutes')
+    if not hibernate_after:
+        return
+    
+    sample_bot_activity(user_id, bot_info)
+    if datetime.now() - bot_info['last_activity'] <= timedelta(minutes=hibernate_after):
+        return
+    
+    # Updates waiting for a polling bot mean it is in use, just slow
+    if await has_pending_updates(session, bot_info['token']):
+        bot_info['last_activity'] = datetime.now()
+        return
+    
+    await hibernate_hosted_bot(user_id, bot_info)
+
+async def monitor_hosted_bots():
+    """Restart crashed bots, hibernate idle ones and wake those with new updates"""
+    async with ClientSession(timeout=ClientTimeout(total=10)) as session:
+        while True:
+            await asyncio.sleep(MONITOR_INTERVAL)
+            
+            # One failing step or bot must not end supervision of all the others
+            if NODE_AGENTS:
+                try:
+                    await refresh_node_stats(reconcile=True)
+                except Exception as e:
+                    logger.error(f"Node refresh error: {e}")
+            
+            try:
+                await wake_hibernated_bots(session)
+            except Exception as e:
+                logger.error(f"Wake error: {e}")
+            
+            for user_id, bots in list(user_bots.items()):
+                limits = get_plan_limits(user_id)
+                
+                for bot_info in list(bots):
+                    if bot_info['status'] != 'running':
+                        continue
+                    try:
+                        await supervise_hosted_bot(session, user_id, bot_info, limits)
+                    except Exception as e:
+                        logger.error(f"Monitor error for {bot_info['name']} ({user_id}): {e}")
+
+# ============================================================
+# NODE CLUSTER
+# ============================================================
+
+# Nodes bots can be placed on; the control bot's own machine is always one of them
+nodes = {LOCAL_NODE: {'url': None, 'online': True, 'draining': False, 'stats': {}, 'updated': None}}
+for _i, _url in enumerate(NODE_AGENTS, 1):
+    nodes[f"node{_i}"] = {'url': _url, 'online': False, 'draining': False, 'stats': {}, 'updated': None}
+
+async def call_node_agent(node_name, method, path, timeout=NODE_AGENT_TIMEOUT, **kwargs):
+    """Call a node agent's HTTP API"""
+    headers = {"X-Node-Secret": NODE_AGENT_SECRET}
+    async with ClientSession(headers=headers, timeout=ClientTimeout(total=timeout)) as session:
+        async with session.request(method, nodes[node_name]['url'] + path, **kwargs) as resp:
+            resp.raise_for_status()
+            if resp.content_type == 'application/json':
+                return await resp.json()
+            return await resp.text()
+
+def collect_node_stats(processes):
+    """Collect RAM, CPU and per-bot usage for this machine"""
+    memory = psutil.virtual_memory()
+    return {
+        'total_ram_mb': memory.total // (1024 * 1024),
+        'available_ram_mb': memory.available // (1024 * 1024),
+        'cpu_percent': psutil.cpu_percent(),
+        'bots': {
+            key: get_process_usage(entry['process'], entry['log_path'])
+            for key, entry in processes.items()
+        }
+    }
+
+async def refresh_one_node(node_name):
+    """Fetch a node's stats, marking it offline if its agent doesn't answer"""
+    node = nodes[node_name]
+    if node['url'] is None:
+        node['stats'] = collect_node_stats({})
+    else:
+        try:
+            node['stats'] = await call_node_agent(node_name, 'GET', '/stats', timeout=NODE_STATS_TIMEOUT)
+            if not node['online']:
+                logger.info(f"🛰️ Node {node_name} online")
+            node['online'] = True
+        except Exception as e:
+            if node['online']:
+                logger.warning(f"🛰️ Node {node_name} offline: {e}")
+            node['online'] = False
+            node['stats'] = {}
+    node['updated'] = datetime.now()
+
+async def refresh_node_stats(max_age=0, reconcile=False):
+    """Refresh stats of every node older than max_age seconds, optionally stopping strays"""
+    stale = [
+        node_name for node_name, node in nodes.items()
+        if not node['updated'] or (datetime.now() - node['updated']).total_seconds() >= max_age
+    ]
+    await asyncio.gather(*(refresh_one_node(node_name) for node_name in stale))
+    
+    if reconcile:
+        for node_name in stale:
+            if nodes[node_name]['url'] and nodes[node_name]['online']:
+                await reconcile_node(node_name)
+
+async def reconcile_node(node_name):
+    """Stop bots a node still runs although we stopped them or placed them elsewhere"""
+    placed = {
+        get_bot_key(user_id, bot_info): bot_info
+        for user_id, bots in user_bots.items()
+        for bot_info in bots
+    }
+    
+    for bot_key, usage in list(nodes[node_name]['stats'].get('bots', {}).items()):
+        if not usage['alive']:
+            continue
+        bot_info = placed.get(bot_key)
+        if bot_info is not None and (
+            get_bot_lock(bot_info).locked()
+            or (bot_info['status'] == 'running' and bot_info.get('node') == node_name)
+        ):
+            continue
+        
+        logger.warning(f"🛰️ Stopping stray {bot_key} on {node_name}")
+        try:
+            await call_node_agent(node_name, 'DELETE', f"/bots/{bot_key}")
+        except Exception as e:
+            logger.error(f"Stray stop on {node_name} failed: {e}")
+            continue
+        nodes[node_name]['stats']['bots'].pop(bot_key, None)
+
+def get_reserved_ram_mb(node_name):
+    """Get RAM reserved on a node by the plans of the bots running there"""
+    return sum(
+        get_plan_limits(user_id)['max_ram_mb']
+        for user_id, bots in user_bots.items()
+        for bot_info in bots
+        if bot_info['status'] == 'running' and bot_info.get('node', LOCAL_NODE) == node_name
+    )
+
+def get_node_free_ram_mb(node_name):
+    """Get RAM a node can still promise, after reservations and actual use"""
+    stats = nodes[node_name]['stats']
+    return min(stats['available_ram_mb'], stats['total_ram_mb'] - get_reserved_ram_mb(node_name))
+
+async def place_bot(max_ram_mb):
+    """Pick the node with the most free RAM (then least CPU) that fits max_ram_mb"""
+    await refresh_node_stats(max_age=5)
+    
+    candidates = []
+    for node_name, node in nodes.items():
+        if node['draining'] or not node['online'] or not node['stats']:
+            continue
+        free_ram_mb = get_node_free_ram_mb(node_name)
+        if free_ram_mb >= max_ram_mb:
+            candidates.append((free_ram_mb, -node['stats']['cpu_percent'], node_name))
+    
+    if not candidates:
+        raise RuntimeError(f"No node has {max_ram_mb} MB free")
+    return max(candidates)[2]
+
+def find_bot_node(bot_key):
+    """Get the remote node a bot is already running on, if any"""
+    for node_name, node in nodes.items():
+        usage = node['stats'].get('bots', {}).get(bot_key) if node['url'] else None
+        if usage and usage['alive']:
+            return node_name
+    return None
+
+def pack_bot_folder(folder):
+    """Zip a bot folder for shipping to a node agent"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zip_ref:
+        for root, _, files in os.walk(folder):
+            for name in files:
+                path = os.path.join(root, name)
+                zip_ref.write(path, os.path.relpath(path, folder))
+    return buffer.getvalue()
+
+async def spawn_on_node(node_name, user_id, bot_info):
+    """Ship a bot to a node agent and start it there"""
+    bot_key = get_bot_key(user_id, bot_info)
+    archive = await asyncio.to_thread(pack_bot_folder, bot_info['folder'])
+    
+    form = FormData()
+    form.add_field('token', bot_info['token'])
+    form.add_field('archive', archive, filename='bot.zip')
+    try:
+        result = await call_node_agent(
+            node_name, 'POST', f"/bots/{bot_key}", timeout=NODE_SPAWN_TIMEOUT, data=form
+        )
+    except Exception:
+        # The agent may have started it anyway; stray checks catch it if this fails too
+        try:
+            await call_node_agent(node_name, 'DELETE', f"/bots/{bot_key}")
+        except Exception:
+            pass
+        raise
+    
+    # Count the bot as alive until the next stats refresh sees it
+    nodes[node_name]['stats'].setdefault('bots', {})[bot_key] = {
+        'alive': True, 'pid': result['pid'], 'rss': 0, 'cpu_seconds': 0.0, 'log_size': 0
+    }
+    return result['pid']
+
+async def stop_on_node(node_name, user_id, bot_info):
+    """Stop a bot running on a node agent"""
+    bot_key = get_bot_key(user_id, bot_info)
+    try:
+        await call_node_agent(node_name, 'DELETE', f"/bots/{bot_key}")
+    except Exception as e:
+        logger.error(f"Stop on {node_name} failed: {e}")
+    nodes[node_name]['stats'].get('bots', {}).pop(bot_key, None)
+
+async def read_bot_log(user_id, bot_info, lines=30):
+    """Get the last lines of a hosted bot's log from the node it runs on"""
+    node_name = bot_info.get('node', LOCAL_NODE)
+    if node_name == LOCAL_NODE or not nodes.get(node_name, {}).get('online'):
+        return tail_file(get_log_path(user_id, bot_info), lines)
+    return await call_node_agent(
+        node_name, 'GET', f"/bots/{get_bot_key(user_id, bot_info)}/logs", params={'lines': lines}
+    )
+
+async def drain_node(node_name):
+    """Move every running bot off a node; returns how many were moved"""
+    nodes[node_name]['draining'] = True
+    moved = 0
+    
+    for user_id, bots in list(user_bots.items()):
+        for bot_info in bots:
+            if bot_info['status'] != 'running' or bot_info.get('node', LOCAL_NODE) != node_name:
+                continue
+            await stop_hosted_bot(user_id, bot_info)
+            try:
+                await start_hosted_bot(user_id, bot_info)
+                moved += 1
+            except Exception as e:
+                logger.error(f"Rebalance error for {bot_info['name']}: {e}")
+    
+    logger.info(f"🛰️ Drained {node_name}, moved {moved} bots")
+    return moved
+
+# ============================================================
+# LOG SEARCH INDEX
+# ============================================================
+
+def get_log_shard_path(day):
+    """Get the index shard holding log lines written on a given day"""
+    return os.path.join(LOG_INDEX_FOLDER, f"{day.isoformat()}.db")
+
+def open_log_shard(path):
+    """Open an index shard, upgrading one made before bot_key was indexed"""
+    schema = "CREATE VIRTUAL TABLE IF NOT EXISTS log_lines USING fts5(bot_key, ts UNINDEXED, line)"
+    conn = sqlite3.connect(path)
+    c = conn.cursor()
+    c.execute("SELECT sql FROM sqlite_master WHERE name = 'log_lines'")
+    row = c.fetchone()
+    if row and 'bot_key UNINDEXED' in row[0]:
+        c.execute("ALTER TABLE log_lines RENAME TO old_log_lines")
+        c.execute(schema)
+        c.execute("INSERT INTO log_lines (rowid, bot_key, ts, line) SELECT rowid, bot_key, ts, line FROM old_log_lines")
+        c.execute("DROP TABLE old_log_lines")
+        conn.commit()
+    else:
+        c.execute(schema)
+    return conn
+
+def read_log_increment(path, offset):
+    """Read complete lines appended to a log since offset; returns (new_offset, text)
+
+    A negative offset starts at the current end, so old output is never indexed as new.
+    """
+    if not os.path.exists(path):
+        return 0, ""
+    size = os.path.getsize(path)
+    if offset < 0:
+        return size, ""
+    if size < offset:
+        offset = 0  # log was truncated or replaced
+    
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        data = f.read(LOG_INDEX_CHUNK_BYTES)
+    
+    end = data.rfind(b"\n") + 1
+    if end == 0 and len(data) == LOG_INDEX_CHUNK_BYTES:
+        end = len(data)  # one huge line (e.g. \r progress bars); index it rather than stall
+    return offset + end, data[:end].decode(errors='replace')
+
+def get_line_time(line, fallback):
+    """Get when a log line was written, from its own timestamp if it has one"""
+    match = LOG_TIMESTAMP_RE.match(line)
+    if match:
+        try:
+            return int(datetime.strptime(f"{match[1]} {match[2]}", "%Y-%m-%d %H:%M:%S").timestamp())
+        except ValueError:
+            pass
+    return fallback
+
+def get_undated_line_time(previous):
+    """Get the time to give new lines without a timestamp of their own"""
+    now = datetime.now().timestamp()
+    if previous and previous[1] and now - previous[1] > 3 * LOG_INDEX_INTERVAL:
+        # Written during a gap in indexing (control bot down, node offline); don't call it new
+        return int(previous[1])
+    return int(now)
+
+def index_log_lines(entries):
+    """Add new log chunks to the shard of the day each line was written and save offsets"""
+    os.makedirs(LOG_INDEX_FOLDER, exist_ok=True)
+    shards = {}
+    for _, _, bot_key, text, undated_ts in entries:
+        for line in text.splitlines():
+            if line.strip():
+                ts = get_line_time(line, undated_ts)
+                shards.setdefault(datetime.fromtimestamp(ts).date(), []).append((bot_key, ts, line))
+    
+    for day, rows in shards.items():
+        conn = open_log_shard(get_log_shard_path(day))
+        c = conn.cursor()
+        c.executemany("INSERT INTO log_lines (bot_key, ts, line) VALUES (?, ?, ?)", rows)
+        conn.commit()
+        conn.close()
+    
+    now = datetime.now().timestamp()
+    conn = sqlite3.connect(DATABASE_PATH)
+    c = conn.cursor()
+    c.executemany(
+        "INSERT OR REPLACE INTO log_index_offsets (source, offset, indexed_at) VALUES (?, ?, ?)",
+        [(source, offset, now) for source, offset, _, _, _ in entries]
+    )
+    conn.commit()
+    conn.close()
+
+def get_log_offsets():
+    """Get how far, and when last, each log source was indexed"""
+    conn = sqlite3.connect(DATABASE_PATH)
+    c = conn.cursor()
+    c.execute("SELECT source, offset, indexed_at FROM log_index_offsets")
+    offsets = {source: (offset, indexed_at) for source, offset, indexed_at in c.fetchall()}
+    conn.close()
+    return offsets
+
+def prune_log_index():
+    """Delete index shards older than the retention period"""
+    if not os.path.exists(LOG_INDEX_FOLDER):
+        return
+    cutoff = (datetime.now() - timedelta(days=LOG_RETENTION_DAYS)).date().isoformat()
+    for name in os.listdir(LOG_INDEX_FOLDER):
+        if name.endswith(".db") and name[:-3] < cutoff:
+            os.remove(os.path.join(LOG_INDEX_FOLDER, name))
+            logger.info(f"🗑️ Pruned log index shard {name}")
+
+def read_local_log_increments(bots):
+    """Read new output of every bot's local log; returns (offsets, entries)"""
+    offsets = get_log_offsets()
+    entries = []
+    for user_id, bot_info in bots:
+        bot_key = get_bot_key(user_id, bot_info)
+        source = f"{LOCAL_NODE}:{bot_key}"
+        previous = offsets.get(source)
+        offset, text = read_log_increment(get_log_path(user_id, bot_info), previous[0] if previous else -1)
+        entries.append((source, offset, bot_key, text, get_undated_line_time(previous)))
+    return offsets, entries
+
+async def collect_log_increments():
+    """Read new log output of every hosted bot from the node it runs on"""
+    bots = [(user_id, bot_info) for user_id, bots in list(user_bots.items()) for bot_info in bots]
+    offsets, entries = await asyncio.to_thread(read_local_log_increments, bots)
+    
+    for user_id, bot_info in bots:
+        node_name = bot_info.get('node', LOCAL_NODE)
+        if node_name == LOCAL_NODE or not nodes[node_name]['online']:
+            continue
+        
+        bot_key = get_bot_key(user_id, bot_info)
+        source = f"{node_name}:{bot_key}"
+        previous = offsets.get(source)
+        try:
+            result = await call_node_agent(
+                node_name, 'GET', f"/bots/{bot_key}/logs", params={'offset': previous[0] if previous else -1}
+            )
+        except Exception as e:
+            logger.error(f"Log fetch from {node_name} failed: {e}")
+            continue
+        entries.append((source, result['offset'], bot_key, result['text'], get_undated_line_time(previous)))
+    
+    return entries
+
+async def index_hosted_bot_logs():
+    """Keep the log search index up to date and within retention"""
+    last_prune = None
+    while True:
+        try:
+            entries = await collect_log_increments()
+            if entries:
+                await asyncio.to_thread(index_log_lines, entries)
+            
+            if last_prune != datetime.now().date():
+                await asyncio.to_thread(prune_log_index)
+                last_prune = datetime.now().date()
+        except Exception as e:
+            logger.error(f"Log indexing error: {e}")
+        
+        await asyncio.sleep(LOG_INDEX_INTERVAL)
+
+def quote_fts_phrase(text):
+    """Quote text as a single FTS5 phrase"""
+    return '"' + text.replace('"', '""') + '"'
+
+def build_match_query(query, bot_key=None):
+    """Turn free text into an FTS5 query matching lines with every word, of one bot if given"""
+    terms = query.split()
+    if not terms:
+        return ""
+    match = f"line : ({' '.join(quote_fts_phrase(term) for term in terms)})"
+    if bot_key is not None:
+        # Narrows the search inside the index; the key is compared exactly afterwards
+        match += f" AND bot_key : ^{quote_fts_phrase(bot_key)}"
+    return match
+
+def search_logs(query, since, bot_key=None, limit=LOG_SEARCH_LIMIT):
+    """Search indexed log lines newer than since, newest first"""
+    match = build_match_query(query, bot_key)
+    if not match:
+        return []
+    
+    sql = "SELECT bot_key, ts, line FROM log_lines WHERE log_lines MATCH ? AND ts >= ?"
+    params = [match, int(since.timestamp())]
+    if bot_key is not None:
+        sql += " AND bot_key = ?"
+        params.append(bot_key)
+    sql += " ORDER BY rowid DESC LIMIT ?"
+    
+    results = []
+    day = datetime.now().date()
+    while day >= since.date() and len(results) < limit:
+        shard = get_log_shard_path(day)
+        day -= timedelta(days=1)
+        if not os.path.exists(shard):
+            continue
+        
+        conn = open_log_shard(shard)
+        c = conn.cursor()
+        c.execute(sql, params + [limit - len(results)])
+        results.extend(c.fetchall())
+        conn.close()
+    
+    return results
+
+def format_log_results(results):
+    """Format search hits as plain text lines"""
+    if not results:
+        return "No matching log lines."
+    return "\n".join(
+        f"{datetime.fromtimestamp(ts).strftime('%m-%d %H:%M:%S')} {bot_key}: {line[:300]}"
+        for bot_key, ts, line in results
+    )
+
 # ============================================================
 # TELEGRAM HANDLERS
 # ============================================================
@@ -364,37 +1607,14 @@ async def button_home(message: types.Message):
 async def button_mybots(message: types.Message):
     """My Bots button"""
     user_id = message.from_user.id
+    text, keyboard = render_my_bots(user_id)
     
-    if user_id not in user_bots or not user_bots[user_id]:
-        await message.answer(
-            "🤖 You have no deployed bots yet.\\n\\n"
-            "Tap **🚀 Deploy Bot** to deploy your first bot!",
-            reply_markup=get_main_keyboard(),
-            parse_mode="Markdown"
-        )
+    if keyboard is None:
+        await message.answer(text, reply_markup=get_main_keyboard(), parse_mode="Markdown")
         return
     
-    text = "🤖 **Your Deployed Bots:**\\n\\n"
-    
-    keyboard_buttons = []
-    for i, bot_info in enumerate(user_bots[user_id]):
-        status_emoji = "🟢" if bot_info['status'] == 'running' else "🔴"
-        text += f"{status_emoji} **{bot_info['name']}**\\n"
-        text += f"Status: {bot_info['status']}\\n\\n"
-        
-        keyboard_buttons.append([
-            InlineKeyboardButton(
-                text=f"{status_emoji} {bot_info['name'][:20]}",
-                callback_data=f"bot:{i}"
-            )
-        ])
-    
-    keyboard_buttons.append([
-        InlineKeyboardButton(text="🚀 Deploy New Bot", callback_data="deploy_new")
-    ])
-    
-    keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
-    await message.answer(text, reply_markup=keyboard, parse_mode="Markdown")
+    sent = await message.answer(text, reply_markup=keyboard, parse_mode="Markdown")
+    remember_view(sent, (text, keyboard))
 
 @dp.message(F.text == "🚀 Deploy Bot")
 async def button_deploy(message: types.Message):
@@ -470,13 +1690,7 @@ async def button_plans(message: types.Message):
 • VIP support
 """
     
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="⭐ Buy Starter", callback_data="buy:starter")],
-        [InlineKeyboardButton(text="💎 Buy Pro", callback_data="buy:pro")],
-        [InlineKeyboardButton(text="👑 Buy Enterprise", callback_data="buy:enterprise")]
-    ])
-    
-    await message.answer(text, reply_markup=keyboard, parse_mode="Markdown")
+    await message.answer(text, reply_markup=PLANS_KEYBOARD, parse_mode="Markdown")
 
 @dp.message(F.text == "📊 Status")
 async def button_status(message: types.Message):
@@ -615,6 +1829,7 @@ async def handle_bot_upload(message: types.Message):
             'status': 'awaiting_token',
             'process': None
         })
+        invalidate_user_views(user_id)
         
     except Exception as e:
         logger.error(f"Deployment error: {e}")
@@ -633,9 +1848,23 @@ async def handle_text(message: types.Message):
     user_id = message.from_user.id
     
     # Check if button text
-    if message.text in ["🏠 Home", "🤖 My Bots", "🚀 Deploy Bot", "💎 Plans", "📊 Status", "ℹ️ Help"]:
+    if message.text in MENU_BUTTONS:
         return
     
+    # Check if waiting for log search text
+    if user_id in pending_log_searches:
+        bot_info = get_hosted_bot(user_id, pending_log_searches.pop(user_id)[0])
+        if bot_info is not None:
+            since = datetime.now() - timedelta(days=LOG_RETENTION_DAYS)
+            results = await asyncio.to_thread(
+                search_logs, message.text, since, get_bot_key(user_id, bot_info)
+            )
+            await message.answer(
+                f"🔎 {bot_info['name']} logs\n\n{format_log_results(results)}"[:4000],
+                reply_markup=get_main_keyboard()
+            )
+            return
+    
     # Check if waiting for bot token
     if user_id in user_bots:
         for bot_info in user_bots[user_id]:
@@ -651,6 +1880,7 @@ async def handle_text(message: types.Message):
                 
                 bot_info['token'] = token
                 bot_info['status'] = 'deployed'
+                invalidate_user_views(user_id)
                 
                 # Install requirements
                 req_file = os.path.join(bot_info['folder'], 'requirements.txt')
@@ -705,29 +1935,387 @@ async def callback_bot_actions(callback: types.CallbackQuery):
         await callback.answer("Bot not found!", show_alert=True)
         return
     
-    bot_info = user_bots[user_id][bot_index]
+    await edit_view(callback.message, render_bot_actions(user_id, bot_index))
+    await callback.answer()
+
+@dp.callback_query(F.data == "my_bots_inline")
+async def callback_my_bots_inline(callback: types.CallbackQuery):
+    """Show bot list in place of the current message"""
+    await edit_view(callback.message, render_my_bots(callback.from_user.id))
+    await callback.answer()
+
+def get_hosted_bot(user_id, bot_index):
+    """Get user's bot by index, or None"""
+    if user_id not in user_bots or bot_index >= len(user_bots[user_id]):
+        return None
+    return user_bots[user_id][bot_index]
+
+@dp.callback_query(F.data.startswith("start:"))
+async def callback_start_bot(callback: types.CallbackQuery):
+    """Start a hosted bot"""
+    user_id = callback.from_user.id
+    bot_index = int(callback.data.split(":")[1])
+    bot_info = get_hosted_bot(user_id, bot_index)
     
-    text = f"""
-🤖 **{bot_info['name']}**
+    if bot_info is None:
+        await callback.answer("Bot not found!", show_alert=True)
+        return
+    
+    if bot_info['status'] == 'awaiting_token':
+        await callback.answer("❌ Send the bot token first!", show_alert=True)
+        return
+    
+    if bot_info['status'] != 'running':
+        try:
+            await start_hosted_bot(user_id, bot_info)
+        except Exception as e:
+            logger.error(f"Start error: {e}")
+            await callback.answer(f"❌ Failed to start: {e}", show_alert=True)
+            return
+    
+    await edit_view(callback.message, render_bot_actions(user_id, bot_index))
+    await callback.answer("▶️ Bot started!")
 
-Status: {'🟢 Running' if bot_info['status'] == 'running' else '🔴 Stopped'}
-"""
+@dp.callback_query(F.data.startswith("stop:"))
+async def callback_stop_bot(callback: types.CallbackQuery):
+    """Stop a hosted bot"""
+    user_id = callback.from_user.id
+    bot_index = int(callback.data.split(":")[1])
+    bot_info = get_hosted_bot(user_id, bot_index)
     
-    buttons = []
-    if bot_info['status'] == 'running':
-        buttons.append([InlineKeyboardButton(text="⏹️ Stop", callback_data=f"stop:{bot_index}")])
-        buttons.append([InlineKeyboardButton(text="🔄 Restart", callback_data=f"restart:{bot_index}")])
-    else:
-        buttons.append([InlineKeyboardButton(text="▶️ Start", callback_data=f"start:{bot_index}")])
+    if bot_info is None:
+        await callback.answer("Bot not found!", show_alert=True)
+        return
     
-    buttons.append([InlineKeyboardButton(text="📋 Logs", callback_data=f"logs:{bot_index}")])
-    buttons.append([InlineKeyboardButton(text="🗑️ Delete", callback_data=f"delbot:{bot_index}")])
-    buttons.append([InlineKeyboardButton(text="🔙 Back", callback_data="my_bots_inline")])
+    await stop_hosted_bot(user_id, bot_info)
+    await edit_view(callback.message, render_bot_actions(user_id, bot_index))
+    await callback.answer("⏹️ Bot stopped!")
+
+@dp.callback_query(F.data.startswith("restart:"))
+async def callback_restart_bot(callback: types.CallbackQuery):
+    """Restart a hosted bot"""
+    user_id = callback.from_user.id
+    bot_index = int(callback.data.split(":")[1])
+    bot_info = get_hosted_bot(user_id, bot_index)
+    
+    if bot_info is None:
+        await callback.answer("Bot not found!", show_alert=True)
+        return
+    
+    await stop_hosted_bot(user_id, bot_info)
+    try:
+        await start_hosted_bot(user_id, bot_info)
+    except Exception as e:
+        logger.error(f"Restart error: {e}")
+        await callback.answer(f"❌ Failed to restart: {e}", show_alert=True)
+        return
+    
+    await edit_view(callback.message, render_bot_actions(user_id, bot_index))
+    await callback.answer("🔄 Bot restarted!")
+
+@dp.callback_query(F.data.startswith("logs:"))
+async def callback_bot_logs(callback: types.CallbackQuery):
+    """Show the last lines of a hosted bot's log"""
+    user_id = callback.from_user.id
+    bot_index = int(callback.data.split(":")[1])
+    bot_info = get_hosted_bot(user_id, bot_index)
     
-    keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
-    await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
+    if bot_info is None:
+        await callback.answer("Bot not found!", show_alert=True)
+        return
+    
+    try:
+        log_text = await read_bot_log(user_id, bot_info)
+    except Exception as e:
+        logger.error(f"Log read error: {e}")
+        await callback.answer("❌ Couldn't read logs right now", show_alert=True)
+        return
+    
+    await callback.message.answer(
+        f"📋 Logs for {bot_info['name']}:\n\n{log_text[-3500:] or '(empty)'}"
+    )
+    await callback.answer()
+
+@dp.callback_query(F.data.startswith("logsearch:"))
+async def callback_search_logs(callback: types.CallbackQuery):
+    """Ask for text to search in a hosted bot's logs"""
+    user_id = callback.from_user.id
+    bot_index = int(callback.data.split(":")[1])
+    
+    if get_hosted_bot(user_id, bot_index) is None:
+        await callback.answer("Bot not found!", show_alert=True)
+        return
+    
+    pending_log_searches[user_id] = (bot_index, datetime.now())
+    await callback.message.answer(
+        f"🔎 Send the text to search for (last {LOG_RETENTION_DAYS} days of logs)"
+    )
     await callback.answer()
 
+# ============================================================
+# ADMIN COMMANDS
+# ============================================================
+
+@dp.message(Command("nodes"))
+async def cmd_nodes(message: types.Message):
+    """Show hosting nodes and their load"""
+    if message.from_user.id not in admin_ids:
+        return
+    
+    await refresh_node_stats()
+    
+    text = "🛰️ Nodes\n\n"
+    for node_name, node in nodes.items():
+        bot_count = sum(
+            1 for bots in user_bots.values() for bot_info in bots
+            if bot_info['status'] == 'running' and bot_info.get('node', LOCAL_NODE) == node_name
+        )
+        state = "🟢" if node['online'] else "🔴"
+        if node['draining']:
+            state += " draining"
+        text += f"{state} {node_name} {node['url'] or ''}\n"
+        if node['stats']:
+            text += (
+                f"   Bots: {bot_count}, CPU: {node['stats']['cpu_percent']}%\n"
+                f"   RAM free: {get_node_free_ram_mb(node_name)} MB "
+                f"(reserved {get_reserved_ram_mb(node_name)} MB)\n"
+            )
+    
+    await message.answer(text)
+
+@dp.message(Command("drain"))
+async def cmd_drain(message: types.Message):
+    """Move all bots off a node: /drain <node>"""
+    if message.from_user.id not in admin_ids:
+        return
+    
+    node_name = message.text.split(maxsplit=1)[1].strip() if " " in message.text else ""
+    if node_name not in nodes:
+        await message.answer(f"❌ Unknown node. Nodes: {', '.join(nodes)}")
+        return
+    
+    await message.answer(f"🛰️ Draining {node_name}...")
+    moved = await drain_node(node_name)
+    await message.answer(f"✅ {node_name} drained, moved {moved} bots")
+
+@dp.message(Command("undrain"))
+async def cmd_undrain(message: types.Message):
+    """Let a drained node take bots again: /undrain <node>"""
+    if message.from_user.id not in admin_ids:
+        return
+    
+    node_name = message.text.split(maxsplit=1)[1].strip() if " " in message.text else ""
+    if node_name not in nodes:
+        await message.answer(f"❌ Unknown node. Nodes: {', '.join(nodes)}")
+        return
+    
+    nodes[node_name]['draining'] = False
+    await message.answer(f"✅ {node_name} accepts bots again")
+
+@dp.message(Command("logsearch"))
+async def cmd_logsearch(message: types.Message):
+    """Search all hosted bot logs: /logsearch [1h|30m|2d] <text>"""
+    if message.from_user.id not in admin_ids:
+        return
+    
+    args = message.text.split()[1:]
+    since = datetime.now() - timedelta(days=LOG_RETENTION_DAYS)
+    if args and re.match(r'^\d+[mhd]$', args[0]):
+        unit = {'m': 'minutes', 'h': 'hours', 'd': 'days'}[args[0][-1]]
+        since = datetime.now() - timedelta(**{unit: int(args[0][:-1])})
+        args = args[1:]
+    
+    if not args:
+        await message.answer("Usage: /logsearch [1h|30m|2d] <text>")
+        return
+    
+    results = await asyncio.to_thread(search_logs, " ".join(args), since)
+    await message.answer(f"🔎 Log search\n\n{format_log_results(results)}"[:4000])
+
+# ============================================================
+# SHARED WEBHOOK GATEWAY
+# ============================================================
+
+# Open gateway channels: {bot_key: channel}
+gateway_channels = {}
+
+def gateway_enabled():
+    """Check if hosted bots may receive updates through the gateway"""
+    return USE_GATEWAY and USE_WEBHOOK and warm_pool is not None
+
+def get_gateway_key(token):
+    """Get the webhook path key for a hosted bot token"""
+    return hashlib.sha256(token.encode()).hexdigest()[:16]
+
+def get_gateway_secret(token):
+    """Get the secret Telegram sends back with a hosted bot's updates"""
+    return hashlib.sha256(f"gateway:{token}".encode()).hexdigest()
+
+async def open_gateway_channel(user_id, bot_info):
+    """Listen for the bot's process; its webhook moves to the gateway once the process connects"""
+    key = get_gateway_key(bot_info['token'])
+    if key in gateway_channels:
+        return gateway_channels[key]
+    
+    os.makedirs(GATEWAY_SOCKETS_FOLDER, exist_ok=True)
+    socket_path = os.path.abspath(os.path.join(GATEWAY_SOCKETS_FOLDER, f"{key}.sock"))
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    
+    channel = {
+        'user_id': user_id,
+        'bot_info': bot_info,
+        'socket_path': socket_path,
+        'buffer': deque(maxlen=GATEWAY_BUFFER_SIZE),
+        'writer': None,
+        'lock': asyncio.Lock(),
+        'active': False  # webhook points here; until then updates aren't accepted
+    }
+    channel['server'] = await asyncio.start_unix_server(
+        lambda reader, writer: handle_gateway_child(channel, reader, writer),
+        path=socket_path
+    )
+    channel['expiry'] = asyncio.create_task(expire_gateway_channel(channel))
+    gateway_channels[key] = channel
+    return channel
+
+async def activate_gateway_channel(channel, allowed_updates):
+    """Point the bot's webhook at the gateway, asking for the updates its process handles"""
+    if channel['active']:
+        return True
+    
+    bot_info = channel['bot_info']
+    key = get_gateway_key(bot_info['token'])
+    hosted_bot = Bot(token=bot_info['token'])
+    try:
+        await hosted_bot.set_webhook(
+            f"{GATEWAY_URL}/hosted/{key}",
+            secret_token=get_gateway_secret(bot_info['token']),
+            allowed_updates=allowed_updates
+        )
+    except Exception as e:
+        logger.error(f"Gateway webhook error for {bot_info['name']}: {e}")
+        return False
+    finally:
+        await hosted_bot.session.close()
+    channel['active'] = True
+    
+    logger.info(f"🔀 Gateway channel open for {bot_info['name']} ({channel['user_id']})")
+    return True
+
+async def expire_gateway_channel(channel):
+    """Leave a bot on polling if its process never asks to be served by the gateway"""
+    await asyncio.sleep(GATEWAY_CONNECT_TIMEOUT)
+    bot_info = channel['bot_info']
+    key = get_gateway_key(bot_info['token'])
+    if channel['active'] or gateway_channels.get(key) is not channel:
+        return
+    
+    del gateway_channels[key]
+    channel['server'].close()
+    logger.info(f"🔀 {bot_info['name']} ({channel['user_id']}) doesn't use the gateway, left on polling")
+    
+    # A webhook left by an earlier gateway run would make its getUpdates fail
+    hosted_bot = Bot(token=bot_info['token'])
+    try:
+        webhook = await hosted_bot.get_webhook_info()
+        if webhook.url.startswith(f"{GATEWAY_URL}/hosted/"):
+            await hosted_bot.delete_webhook()
+    except Exception as e:
+        logger.error(f"Gateway webhook cleanup failed for {bot_info['name']}: {e}")
+    finally:
+        await hosted_bot.session.close()
+
+async def close_gateway_channel(bot_info):
+    """Hand a bot's updates back to Telegram polling"""
+    channel = gateway_channels.pop(get_gateway_key(bot_info['token']), None)
+    if channel is None:
+        return
+    
+    channel['expiry'].cancel()
+    channel['server'].close()
+    if channel['writer'] is not None:
+        channel['writer'].close()
+    if not channel['active']:
+        return
+    
+    hosted_bot = Bot(token=bot_info['token'])
+    try:
+        await hosted_bot.delete_webhook()
+    except Exception as e:
+        logger.error(f"Gateway webhook removal failed for {bot_info['name']}: {e}")
+    finally:
+        await hosted_bot.session.close()
+
+async def handle_gateway_child(channel, reader, writer):
+    """Serve updates to a hosted bot process until it disconnects"""
+    # The process first says which updates it handles; it is only served once the webhook is ours
+    try:
+        hello = json.loads(await reader.readline() or b"{}")
+        served = await activate_gateway_channel(channel, hello.get('allowed_updates'))
+        writer.write(json.dumps({'gateway': served}).encode() + b"\n")
+        await writer.drain()
+    except (ConnectionError, ValueError):
+        served = False
+    if not served:
+        writer.close()
+        return
+    
+    if channel['writer'] is not None:
+        channel['writer'].close()
+    channel['writer'] = writer
+    
+    await flush_gateway_buffer(channel)
+    try:
+        await reader.read()
+    except ConnectionError:
+        pass
+    finally:
+        if channel['writer'] is writer:
+            channel['writer'] = None
+        writer.close()
+
+async def flush_gateway_buffer(channel):
+    """Forward buffered updates to the bot process, keeping any it can't take"""
+    async with channel['lock']:
+        writer = channel['writer']
+        while channel['buffer'] and writer is not None:
+            try:
+                writer.write(channel['buffer'][0] + b"\n")
+                await writer.drain()
+            except (ConnectionError, RuntimeError):
+                if channel['writer'] is writer:
+                    channel['writer'] = None
+                return
+            channel['buffer'].popleft()
+
+async def hosted_webhook_handler(request):
+    """Receive an update for a hosted bot and forward it to its process"""
+    channel = gateway_channels.get(request.match_info['bot_key'])
+    if channel is None or not channel['active']:
+        return web.Response(status=404)
+    
+    bot_info = channel['bot_info']
+    if request.headers.get("X-Telegram-Bot-Api-Secret-Token") != get_gateway_secret(bot_info['token']):
+        return web.Response(status=403)
+    
+    # Raw newlines in JSON are only whitespace, so this keeps one update per line
+    body = (await request.read()).replace(b"\n", b" ")
+    if len(channel['buffer']) == channel['buffer'].maxlen:
+        logger.warning(f"Gateway buffer full for {bot_info['name']}, dropping oldest update")
+    channel['buffer'].append(body)
+    bot_info['last_activity'] = datetime.now()
+    
+    if bot_info['status'] == 'hibernated':
+        logger.info(f"☀️ Waking {bot_info['name']} for {channel['user_id']}")
+        try:
+            await start_hosted_bot(channel['user_id'], bot_info)
+        except Exception as e:
+            logger.error(f"Wake error: {e}")
+    
+    await flush_gateway_buffer(channel)
+    return web.Response(text="OK")
+
 # ============================================================
 # WEBHOOK SETUP
 # ============================================================
@@ -747,6 +2335,10 @@ async def health_check(request):
 
 async def on_startup():
     init_database()
+    init_warm_pool()
+    await restore_hosted_bots()
+    background_tasks.append(asyncio.create_task(monitor_hosted_bots()))
+    background_tasks.append(asyncio.create_task(index_hosted_bot_logs()))
     
     if USE_WEBHOOK:
         await bot.set_webhook(WEBHOOK_URL)
@@ -755,6 +2347,153 @@ async def on_startup():
         await bot.delete_webhook()
         logger.info("🔄 Polling mode")
 
+# ============================================================
+# NODE AGENT
+# ============================================================
+
+# Bots run by this process when it is a node agent: {bot_key: {'process', 'log_path'}}
+agent_processes = {}
+
+@web.middleware
+async def node_agent_auth(request, handler):
+    """Reject requests without the shared node secret"""
+    if not hmac.compare_digest(request.headers.get("X-Node-Secret", "").encode(), NODE_AGENT_SECRET.encode()):
+        return web.Response(status=403)
+    return await handler(request)
+
+def get_agent_state_path():
+    """Get the file where the agent remembers the bots it runs"""
+    return os.path.join(NODE_AGENT_FOLDER, 'processes.json')
+
+def save_agent_processes():
+    """Remember the bots this agent runs so a restarted agent can adopt them"""
+    state = {}
+    for bot_key, entry in agent_processes.items():
+        try:
+            started = psutil.Process(entry['process'].pid).create_time()
+        except psutil.Error:
+            continue
+        state[bot_key] = {'pid': entry['process'].pid, 'pid_started': started, 'log_path': entry['log_path']}
+    
+    path = get_agent_state_path()
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f)
+    os.replace(path + '.tmp', path)
+
+def restore_agent_processes():
+    """Adopt bots left running by a crashed or restarted agent"""
+    path = get_agent_state_path()
+    if not os.path.exists(path):
+        return
+    with open(path) as f:
+        state = json.load(f)
+    
+    for bot_key, saved in state.items():
+        process = find_bot_process(saved['pid'], saved['pid_started'])
+        if process is not None:
+            agent_processes[bot_key] = {'process': process, 'log_path': saved['log_path']}
+    save_agent_processes()
+    logger.info(f"🛰️ Adopted {len(agent_processes)} of {len(state)} bots from the last run")
+
+def get_agent_bot_key(request):
+    """Get the bot key from the URL, refusing anything that isn't a plain name"""
+    bot_key = request.match_info['bot_key']
+    if not re.match(r'^[\w-]+$', bot_key):
+        raise web.HTTPBadRequest(text="Invalid bot key")
+    return bot_key
+
+def unpack_bot_archive(archive, folder):
+    """Extract a shipped bot and install its requirements if they changed"""
+    os.makedirs(folder, exist_ok=True)
+    with zipfile.ZipFile(io.BytesIO(archive), 'r') as zip_ref:
+        zip_ref.extractall(folder)
+    
+    req_file = os.path.join(folder, 'requirements.txt')
+    marker = os.path.join(folder, '.installed_requirements')
+    if not os.path.exists(req_file):
+        return
+    with open(req_file, 'rb') as f:
+        requirements = f.read()
+    if os.path.exists(marker):
+        with open(marker, 'rb') as f:
+            if f.read() == requirements:
+                return
+    try:
+        subprocess.run(['pip', 'install', '-r', req_file], check=True, capture_output=True)
+        with open(marker, 'wb') as f:
+            f.write(requirements)
+    except Exception as e:
+        logger.error(f"Requirements install failed for {folder}: {e}")
+
+async def agent_spawn_handler(request):
+    bot_key = get_agent_bot_key(request)
+    form = await request.post()
+    
+    entry = agent_processes.pop(bot_key, None)
+    if entry:
+        await terminate_process(entry['process'])
+    
+    folder = os.path.abspath(os.path.join(NODE_AGENT_FOLDER, 'bots', bot_key))
+    log_path = os.path.abspath(os.path.join(NODE_AGENT_FOLDER, 'logs', f"{bot_key}.log"))
+    await asyncio.to_thread(unpack_bot_archive, form['archive'].file.read(), folder)
+    
+    process = spawn_bot_process(folder, form['token'], log_path)
+    agent_processes[bot_key] = {'process': process, 'log_path': log_path}
+    save_agent_processes()
+    logger.info(f"▶️ Started {bot_key} (pid {process.pid})")
+    return web.json_response({'pid': process.pid})
+
+async def agent_stop_handler(request):
+    bot_key = get_agent_bot_key(request)
+    entry = agent_processes.pop(bot_key, None)
+    if entry:
+        await terminate_process(entry['process'])
+        save_agent_processes()
+        logger.info(f"⏹️ Stopped {bot_key}")
+    return web.json_response({'stopped': entry is not None})
+
+async def agent_stats_handler(request):
+    return web.json_response(collect_node_stats(agent_processes))
+
+async def agent_logs_handler(request):
+    bot_key = get_agent_bot_key(request)
+    log_path = os.path.abspath(os.path.join(NODE_AGENT_FOLDER, 'logs', f"{bot_key}.log"))
+    
+    # With an offset, return new complete lines for the control bot's log index
+    if 'offset' in request.query:
+        offset, text = read_log_increment(log_path, int(request.query['offset']))
+        return web.json_response({'offset': offset, 'text': text})
+    
+    lines = int(request.query.get('lines', 30))
+    return web.Response(text=tail_file(log_path, lines))
+
+async def run_node_agent():
+    """Run this script as a node agent that hosts bots for a control bot"""
+    # The API runs uploaded code, so it is never served without a secret
+    if not NODE_AGENT_SECRET:
+        logger.error("❌ NODE_AGENT_SECRET must be set to run a node agent")
+        return
+    
+    os.makedirs(os.path.join(NODE_AGENT_FOLDER, 'bots'), exist_ok=True)
+    os.makedirs(os.path.join(NODE_AGENT_FOLDER, 'logs'), exist_ok=True)
+    init_warm_pool()
+    restore_agent_processes()
+    
+    app = web.Application(middlewares=[node_agent_auth], client_max_size=200 * 1024 * 1024)
+    app.router.add_post("/bots/{bot_key}", agent_spawn_handler)
+    app.router.add_delete("/bots/{bot_key}", agent_stop_handler)
+    app.router.add_get("/bots/{bot_key}/logs", agent_logs_handler)
+    app.router.add_get("/stats", agent_stats_handler)
+    
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host=NODE_AGENT_HOST, port=NODE_AGENT_PORT)
+    
+    logger.info(f"🛰️ Node agent on {NODE_AGENT_HOST}:{NODE_AGENT_PORT}, bots in {NODE_AGENT_FOLDER}")
+    await site.start()
+    
+    await asyncio.Event().wait()
+
 # ============================================================
 # MAIN
 # ============================================================
@@ -763,6 +2502,7 @@ async def main():
     if USE_WEBHOOK:
         app = web.Application()
         app.router.add_post("/", webhook_handler)
+        app.router.add_post("/hosted/{bot_key}", hosted_webhook_handler)
         app.router.add_get("/health", health_check)
         
         await on_startup()
@@ -782,6 +2522,6 @@ async def main():
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        asyncio.run(run_node_agent() if NODE_AGENT_PORT else main())
     except KeyboardInterrupt:
         logger.info("Bot stopped")